@@ -249,6 +249,16 @@ def create_tables():
             )
         """)
         
+        # Indexes for the public lesson and team listings
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_lessons_course_pub_order
+            ON lessons (course_id, is_published, "order")
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_team_active_order
+            ON team_members (is_active, "order")
+        """)
+        
         # Commit the changes
         conn.commit()
         print("✅ All tables created successfully!")
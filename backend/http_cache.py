@@ -0,0 +1,45 @@
+import asyncio
+import hashlib
+from typing import Any, Dict
+
+from cachetools import TTLCache
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Cached public responses may be reused by browsers and proxies for a short time
+PUBLIC_CACHE_CONTROL = "public, max-age=30, stale-while-revalidate=300"
+
+_cache_locks: Dict[Any, asyncio.Lock] = {}
+
+async def cached(cache: TTLCache, key, loader):
+    """Return cache[key], loading it at most once per key under concurrent misses"""
+    if key in cache:
+        return cache[key]
+    
+    lock_key = (id(cache), key)
+    lock = _cache_locks.setdefault(lock_key, asyncio.Lock())
+    try:
+        async with lock:
+            if key in cache:
+                return cache[key]
+            value = await loader()
+            # Missing records are not cached
+            if value is not None:
+                cache[key] = value
+            return value
+    finally:
+        if not lock.locked():
+            _cache_locks.pop(lock_key, None)
+
+def etag_for(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def etag_response(request: Request, entry) -> Response:
+    """Send a cached (body, etag) entry, or an empty 304 if the client already has it"""
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": PUBLIC_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in client_etags or "*" in client_etags:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
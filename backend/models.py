@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -78,10 +78,12 @@ class Course(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
-    def __init__(self, **data):
-        super().__init__(**data)
+    @model_validator(mode="after")
+    def _default_slug(self):
+        # A validator, not __init__: it also runs during FastAPI response validation
         if not self.slug:
             self.slug = create_slug(self.title)
+        return self
 
 class CourseCreate(BaseModel):
     title: str
@@ -135,10 +137,11 @@ class Lesson(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
-    def __init__(self, **data):
-        super().__init__(**data)
+    @model_validator(mode="after")
+    def _default_slug(self):
         if not self.slug:
             self.slug = create_slug(self.title)
+        return self
 
 class LessonCreate(BaseModel):
     course_id: str
@@ -152,6 +155,10 @@ class LessonCreate(BaseModel):
     order: int
     estimated_duration_minutes: int = 15
 
+class LessonBatchRequest(BaseModel):
+    # Bounded: on Supabase the ids go into a single in.(...) query string
+    course_ids: List[str] = Field(..., max_length=100)
+
 class LessonUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -458,10 +465,11 @@ class QAQuestion(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
-    def __init__(self, **data):
-        super().__init__(**data)
+    @model_validator(mode="after")
+    def _default_slug(self):
         if not self.slug:
             self.slug = create_slug(self.title)
+        return self
 
 class QAQuestionCreate(BaseModel):
     title: str
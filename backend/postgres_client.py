@@ -1,4 +1,5 @@
 import os
+import asyncio
 import asyncpg
 import logging
 from typing import List, Dict, Any, Optional
@@ -11,6 +12,17 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Hot read queries, run by name through fetch_named. asyncpg's statement cache
+# (statement_cache_size) prepares each one once per connection and reuses it.
+# Published/active and full listings are separate statements: with a literal
+# filter the cached plan can use the composite indexes on (.., is_published/is_active, "order").
+NAMED_QUERIES = {
+    "published_lessons_by_course": 'SELECT * FROM lessons WHERE course_id = $1 AND is_published ORDER BY "order"',
+    "lessons_by_course": 'SELECT * FROM lessons WHERE course_id = $1 ORDER BY "order"',
+    "active_team_members": 'SELECT * FROM team_members WHERE is_active ORDER BY "order"',
+    "team_members": 'SELECT * FROM team_members ORDER BY "order"',
+}
+
 class PostgreSQLClient:
     def __init__(self):
         self.database_url = os.environ.get('DATABASE_URL')
@@ -18,18 +30,39 @@ class PostgreSQLClient:
             raise ValueError("DATABASE_URL must be set in environment variables")
         
         self.pool = None
+        self._pool_lock = asyncio.Lock()
+        
+        # Pool sizing, overridable per deployment (keep max_size under the server's connection limit)
+        self.pool_min_size = int(os.environ.get('POSTGRES_POOL_MIN_SIZE', 5))
+        self.pool_max_size = int(os.environ.get('POSTGRES_POOL_MAX_SIZE', 20))
+        if self.pool_min_size > self.pool_max_size:
+            logger.warning(
+                f"POSTGRES_POOL_MIN_SIZE={self.pool_min_size} is larger than "
+                f"POSTGRES_POOL_MAX_SIZE={self.pool_max_size}, using min_size={self.pool_max_size}"
+            )
+            self.pool_min_size = self.pool_max_size
         logger.info("PostgreSQL client initialized")
 
     async def init_pool(self):
         """Initialize connection pool"""
-        if not self.pool:
-            self.pool = await asyncpg.create_pool(
-                self.database_url,
-                min_size=1,
-                max_size=10,
-                command_timeout=60
-            )
-            logger.info("PostgreSQL connection pool created")
+        if self.pool:
+            return
+        
+        async with self._pool_lock:
+            if not self.pool:
+                self.pool = await asyncpg.create_pool(
+                    self.database_url,
+                    min_size=self.pool_min_size,
+                    max_size=self.pool_max_size,
+                    max_queries=50000,
+                    max_inactive_connection_lifetime=600.0,
+                    statement_cache_size=1024,
+                    command_timeout=60
+                )
+                logger.info(
+                    f"PostgreSQL connection pool created "
+                    f"(min_size={self.pool_min_size}, max_size={self.pool_max_size})"
+                )
 
     async def close_pool(self):
         """Close connection pool"""
@@ -81,7 +114,8 @@ class PostgreSQLClient:
             raise
 
     async def get_records(self, table: str, filters: Optional[Dict[str, Any]] = None, 
-                         order_by: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+                         order_by: Optional[str] = None, limit: Optional[int] = None,
+                         offset: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get multiple records with optional filters"""
         await self.init_pool()
         
@@ -125,14 +159,19 @@ class PostgreSQLClient:
             
             # Add ORDER BY clause
             if order_by:
+                # Quoted because columns such as "order" are reserved words
                 if order_by.startswith("-"):
-                    query += f" ORDER BY {order_by[1:]} DESC"
+                    query += f" ORDER BY {self._quote_identifier(order_by[1:])} DESC"
                 else:
-                    query += f" ORDER BY {order_by} ASC"
+                    query += f" ORDER BY {self._quote_identifier(order_by)} ASC"
             
-            # Add LIMIT clause
+            # Add LIMIT/OFFSET clauses
             if limit:
-                query += f" LIMIT {limit}"
+                params.append(limit)
+                query += f" LIMIT ${len(params)}"
+            if offset:
+                params.append(offset)
+                query += f" OFFSET ${len(params)}"
             
             async with self.pool.acquire() as conn:
                 rows = await conn.fetch(query, *params)
@@ -143,14 +182,14 @@ class PostgreSQLClient:
             raise
 
     async def update_record(self, table: str, id_field: str, id_value: str, 
-                          data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Update a record by ID"""
+                          data: Dict[str, Any], set_updated_at: bool = False) -> Optional[Dict[str, Any]]:
+        """Update a record by ID; set_updated_at stamps updated_at with the database clock"""
         await self.init_pool()
         
         try:
             processed_data = self._process_data_for_update(data)
             
-            if not processed_data:
+            if not processed_data and not set_updated_at:
                 return None
             
             # Generate SET clause
@@ -159,10 +198,13 @@ class PostgreSQLClient:
             param_count = 1
             
             for field, value in processed_data.items():
-                set_clauses.append(f"{field} = ${param_count}")
+                set_clauses.append(f"{self._quote_identifier(field)} = ${param_count}")
                 values.append(value)
                 param_count += 1
             
+            if set_updated_at:
+                set_clauses.append("updated_at = NOW()")
+            
             values.append(id_value)  # For WHERE clause
             
             query = f"""
@@ -239,24 +281,80 @@ class PostgreSQLClient:
             logger.error(f"Error counting records in {table}: {str(e)}")
             raise
 
+    async def count_many(self, tables: List[str]) -> Dict[str, int]:
+        """Count records in several tables with a single query"""
+        if not tables:
+            return {}
+        
+        await self.init_pool()
+        
+        try:
+            query = " UNION ALL ".join(
+                f"SELECT ${i + 1}::text AS table_name, COUNT(*) AS count FROM {self._quote_identifier(table)}"
+                for i, table in enumerate(tables)
+            )
+            
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(query, *tables)
+                return {row['table_name']: row['count'] for row in rows}
+                
+        except Exception as e:
+            logger.error(f"Error counting records in {len(tables)} tables: {str(e)}")
+            raise
+
     async def find_one(self, table: str, filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Find a single record with filters"""
         records = await self.get_records(table, filters, limit=1)
         return records[0] if records else None
 
-    async def execute_raw_sql(self, query: str, params: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
-        """Execute raw SQL query"""
+    async def execute_raw_sql(self, query: str, params: Optional[List[Any]] = None,
+                              read_only: bool = False) -> List[Dict[str, Any]]:
+        """Execute raw SQL query; read_only runs it in a READ ONLY transaction"""
         await self.init_pool()
         
         try:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch(query, *(params or []))
+                if read_only:
+                    async with conn.transaction(readonly=True):
+                        rows = await conn.fetch(query, *(params or []))
+                else:
+                    rows = await conn.fetch(query, *(params or []))
                 return [dict(row) for row in rows]
                 
         except Exception as e:
             logger.error(f"Error executing raw SQL: {str(e)}")
             raise
 
+    async def fetch_named(self, name: str, *args) -> List[Dict[str, Any]]:
+        """Run one of NAMED_QUERIES by name"""
+        await self.init_pool()
+        
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(NAMED_QUERIES[name], *args)
+                return [dict(row) for row in rows]
+                
+        except Exception as e:
+            logger.error(f"Error executing named query {name}: {str(e)}")
+            raise
+
+    async def execute_command(self, query: str, *args) -> str:
+        """Execute a statement that returns no rows (DDL etc.) and return its status"""
+        await self.init_pool()
+        
+        try:
+            async with self.pool.acquire() as conn:
+                return await conn.execute(query, *args)
+                
+        except Exception as e:
+            logger.error(f"Error executing command: {str(e)}")
+            raise
+
+    @staticmethod
+    def _quote_identifier(name: str) -> str:
+        """Quote a table or column name for use in SQL"""
+        return '"' + name.replace('"', '""') + '"'
+
     def _process_data_for_insert(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Process data before inserting to PostgreSQL"""
         processed = {}
@@ -1,20 +1,25 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import os
 import logging
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import jwt
 from passlib.context import CryptContext
 import asyncio
+import functools
+import hashlib
+import time
 import sys
 import os
+from cachetools import TTLCache
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from models import *
 
@@ -23,7 +28,7 @@ try:
     from postgres_client import postgres_client
     POSTGRES_AVAILABLE = True
     print("✅ PostgreSQL client доступен")
-except ImportError:
+except (ImportError, ValueError):
     POSTGRES_AVAILABLE = False
     print("❌ PostgreSQL client недоступен")
 
@@ -37,12 +42,14 @@ except ImportError:
 
 import shutil
 import aiofiles
-import json
+import orjson
 import csv
 import random
 import io
 import re
 import base64
+from sql_guard import is_read_only_query
+from http_cache import cached, etag_for, etag_response
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -52,7 +59,7 @@ UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
 # Create the main app
-app = FastAPI(title="Уроки Ислама API", version="2.0.0")
+app = FastAPI(title="Уроки Ислама API", version="2.0.0", default_response_class=ORJSONResponse)
 
 # Mount static files
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
@@ -67,6 +74,15 @@ SECRET_KEY = os.getenv("SECRET_KEY", "uroki-islama-secret-key-2024")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Кэш проверенных токенов: sha256(token)[:16] -> (admin, exp)
+# Кэшируются только успешные проверки, TTL ограничивает задержку отзыва доступа
+# Ключ - хэш самого токена, а не claim jti: jti можно доверять только после
+# проверки подписи, а кэш как раз позволяет её пропустить
+_jwt_cache = TTLCache(maxsize=4096, ttl=30)
+
+# Кэш успешных проверок bcrypt: (hash, sha256(password)) -> True
+_pw_cache = TTLCache(maxsize=1024, ttl=60)
+
 # Database client selection
 USE_POSTGRES = os.getenv("USE_POSTGRES", "false").lower() == "true"
 
@@ -79,16 +95,54 @@ elif SUPABASE_AVAILABLE:
 else:
     raise Exception("Ни один клиент базы данных не доступен!")
 
+# По желанию горячие публичные чтения (уроки, команда) идут напрямую в PostgreSQL
+# через пул, даже если основной клиент - Supabase API. Выключено по умолчанию.
+USE_POSTGRES_READS = POSTGRES_AVAILABLE and os.getenv("USE_POSTGRES_READS", "false").lower() == "true"
+
+def _pg_reads() -> bool:
+    """Чтения через пул, только если он создан; иначе запросы идут через db_client"""
+    return USE_POSTGRES_READS and postgres_client.pool is not None
+
+# Известные таблицы приложения
+KNOWN_TABLES = [
+    "courses", "lessons", "tests", "test_questions", "test_attempts",
+    "students", "admin_users", "teachers", "team_members",
+    "qa_questions", "qa_categories", "applications", "status_checks"
+]
+
+# Таблицы, к которым разрешен доступ по имени из запроса.
+# Для PostgreSQL список уточняется из information_schema при старте.
+VALID_TABLES: frozenset = frozenset(KNOWN_TABLES)
+
 # Utility functions
+_last_ts = [0, ""]
+
+def now_iso() -> str:
+    """Current UTC time as an ISO string, recomputed at most once per second"""
+    t = int(time.time())
+    if t != _last_ts[0]:
+        _last_ts[1] = datetime.fromtimestamp(t, timezone.utc).isoformat()
+        _last_ts[0] = t
+    return _last_ts[1]
+
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    # bcrypt is deliberately slow, so remember successful checks for a short time.
+    # Failures are never cached to keep brute force as expensive as before.
+    key = (hashed_password, hashlib.sha256(plain_password.encode()).digest())
+    if key in _pw_cache:
+        return True
+    
+    verified = pwd_context.verify(plain_password, hashed_password)
+    if verified:
+        _pw_cache[key] = True
+    return verified
 
 def get_password_hash(password):
     return pwd_context.hash(password)
@@ -102,12 +156,50 @@ def verify_simple_password(username: str, password: str) -> bool:
     }
     return simple_passwords.get(username) == password
 
+# Admin accounts change rarely, so they are kept in memory and reloaded
+# periodically or right after an admin_users record is changed
+ADMINS_REFRESH_INTERVAL = 60
+_admins: Dict[str, dict] = {}
+_admins_changed = asyncio.Event()
+_admins_refresh_task: Optional[asyncio.Task] = None
+
+async def _load_admins():
+    global _admins
+    rows = await db_client.get_records("admin_users", limit=1000)
+    _admins = {row["username"]: row for row in rows}
+
+async def _admins_refresh_loop():
+    while True:
+        try:
+            await _load_admins()
+        except Exception as e:
+            logger.warning(f"Could not refresh admin users: {e}")
+        try:
+            await asyncio.wait_for(_admins_changed.wait(), timeout=ADMINS_REFRESH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _admins_changed.clear()
+
+def _invalidate_admins():
+    """Drop cached admin data after admin_users was modified"""
+    _admins.clear()
+    _jwt_cache.clear()
+    _admins_changed.set()
+
 async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    key = hashlib.sha256(credentials.credentials.encode()).digest()[:16]
+    cached = _jwt_cache.get(key)
+    if cached is not None:
+        admin, exp = cached
+        if exp is None or exp > time.time():
+            return admin
+        _jwt_cache.pop(key, None)
+    
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -116,9 +208,14 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
     except jwt.PyJWTError:
         raise credentials_exception
     
-    admin = await db_client.find_one("admin_users", {"username": username})
+    admin = _admins.get(username)
+    if admin is None:
+        # Not loaded yet or a newly created admin
+        admin = await db_client.find_one("admin_users", {"username": username})
     if admin is None:
         raise credentials_exception
+    
+    _jwt_cache[key] = (admin, payload.get("exp"))
     return admin
 
 async def require_admin_role(current_admin: dict = Depends(get_current_admin)):
@@ -130,6 +227,13 @@ async def require_admin_role(current_admin: dict = Depends(get_current_admin)):
     return current_admin
 
 # File upload utilities
+UPLOAD_CHUNK_SIZE = 128 * 1024
+
+def _copy_upload(src, file_path: Path):
+    """Stream an uploaded file to disk in fixed-size chunks"""
+    with open(file_path, 'wb', buffering=UPLOAD_CHUNK_SIZE) as dst:
+        shutil.copyfileobj(src, dst, length=UPLOAD_CHUNK_SIZE)
+
 async def save_uploaded_file(upload_file: UploadFile, folder: str = "general") -> str:
     """Save uploaded file and return the URL"""
     file_extension = Path(upload_file.filename).suffix
@@ -138,32 +242,159 @@ async def save_uploaded_file(upload_file: UploadFile, folder: str = "general") -
     folder_path.mkdir(exist_ok=True)
     file_path = folder_path / unique_filename
     
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await upload_file.read()
-        await f.write(content)
+    await upload_file.seek(0)
+    await asyncio.to_thread(_copy_upload, upload_file.file, file_path)
     
     return f"/uploads/{folder}/{unique_filename}"
 
+# Supported YouTube URL formats
+_YT_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    r'(?:https?:\/\/)?(?:www\.)?youtube\.com\/watch\?v=([a-zA-Z0-9_-]+)',
+    r'(?:https?:\/\/)?(?:www\.)?youtu\.be\/([a-zA-Z0-9_-]+)',
+    r'(?:https?:\/\/)?(?:www\.)?youtube\.com\/embed\/([a-zA-Z0-9_-]+)'
+))
+
+@functools.lru_cache(maxsize=4096)
 def convert_to_embed_url(url: str) -> str:
     """Convert YouTube URL to embed format"""
     if not url:
         return url
     
-    # Handle different YouTube URL formats
-    patterns = [
-        r'(?:https?:\/\/)?(?:www\.)?youtube\.com\/watch\?v=([a-zA-Z0-9_-]+)',
-        r'(?:https?:\/\/)?(?:www\.)?youtu\.be\/([a-zA-Z0-9_-]+)',
-        r'(?:https?:\/\/)?(?:www\.)?youtube\.com\/embed\/([a-zA-Z0-9_-]+)'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
+    for pattern in _YT_PATTERNS:
+        match = pattern.search(url)
         if match:
             video_id = match.group(1)
             return f"https://www.youtube.com/embed/{video_id}"
     
     return url
 
+# Student activity stamps are buffered and written in batches
+ACTIVITY_FLUSH_INTERVAL = 5
+_activity_buffer: Dict[str, str] = {}
+_activity_flush_task: Optional[asyncio.Task] = None
+
+async def _flush_activity_buffer():
+    """Write buffered last_activity values to the students table"""
+    if not _activity_buffer:
+        return
+    buffered = dict(_activity_buffer)
+    _activity_buffer.clear()
+    
+    try:
+        if USE_POSTGRES and POSTGRES_AVAILABLE:
+            values = ", ".join(f"(${2 * i + 1}::text, ${2 * i + 2}::text)" for i in range(len(buffered)))
+            params = [item for pair in buffered.items() for item in pair]
+            await db_client.execute_raw_sql(
+                f"UPDATE students AS s SET last_activity = v.t::timestamptz "
+                f"FROM (VALUES {values}) AS v(email, t) WHERE s.email = v.email",
+                params
+            )
+        else:
+            await asyncio.gather(*[
+                db_client.update_record("students", "email", email, {"last_activity": ts})
+                for email, ts in buffered.items()
+            ])
+    except asyncio.CancelledError:
+        _requeue_activity(buffered)
+        raise
+    except Exception as e:
+        # Put the stamps back so the next flush retries them
+        _requeue_activity(buffered)
+        logger.warning(f"Could not flush activity buffer: {e}")
+
+def _requeue_activity(buffered: Dict[str, str]):
+    # Newer stamps buffered in the meantime win
+    for email, ts in buffered.items():
+        _activity_buffer.setdefault(email, ts)
+
+async def _activity_flush_loop():
+    while True:
+        await asyncio.sleep(ACTIVITY_FLUSH_INTERVAL)
+        await _flush_activity_buffer()
+
+# Public read caches. Admin endpoints stay uncached so editors always see fresh data.
+PUBLIC_CACHE_TTL = 60
+# Entries are (json_body, etag) so cache hits are sent without re-encoding
+_lessons_cache = TTLCache(maxsize=1024, ttl=PUBLIC_CACHE_TTL)  # course_id -> published lessons
+_lesson_cache = TTLCache(maxsize=1024, ttl=PUBLIC_CACHE_TTL)   # lesson_id -> lesson
+_team_cache = TTLCache(maxsize=1024, ttl=PUBLIC_CACHE_TTL)     # "active" -> active team members
+
+def _dump_rows(model, rows):
+    """Rows (a list or a single row) shaped like the response model, with defaults such as slug filled in"""
+    if isinstance(rows, list):
+        return [model.model_validate(row).model_dump(mode="json") for row in rows]
+    return model.model_validate(rows).model_dump(mode="json")
+
+async def _encode_entry(rows_coro, model):
+    """Encode loaded rows once and derive their ETag"""
+    rows = await rows_coro
+    if rows is None:
+        return None
+    body = orjson.dumps(_dump_rows(model, rows), option=orjson.OPT_NON_STR_KEYS)
+    return body, etag_for(body)
+
+def _invalidate_lesson_caches(*lessons: Optional[dict]):
+    for lesson in lessons:
+        if lesson:
+            _lesson_cache.pop(lesson.get("id"), None)
+            _lessons_cache.pop(lesson.get("course_id"), None)
+
+def _invalidate_table_caches(table_name: str):
+    """Drop in-memory caches that depend on a table changed through the database admin"""
+    if table_name == "admin_users":
+        _invalidate_admins()
+    elif table_name in ("lessons", "courses"):
+        # Deleting a course cascades to its lessons
+        _lesson_cache.clear()
+        _lessons_cache.clear()
+    elif table_name == "team_members":
+        _team_cache.clear()
+
+# Read helpers for lessons and team members
+async def fetch_lessons(course_id: str, published_only: bool) -> List[Dict[str, Any]]:
+    if _pg_reads():
+        name = "published_lessons_by_course" if published_only else "lessons_by_course"
+        return await postgres_client.fetch_named(name, course_id)
+    filters = {"course_id": course_id}
+    if published_only:
+        filters["is_published"] = True
+    return await db_client.get_records("lessons", filters=filters, order_by="order")
+
+async def fetch_lessons_for_courses(course_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Published lessons for several courses in one query, grouped by course_id"""
+    if _pg_reads():
+        lessons = await postgres_client.execute_raw_sql(
+            'SELECT * FROM lessons WHERE course_id = ANY($1::text[]) AND is_published ORDER BY course_id, "order"',
+            [course_ids]
+        )
+    else:
+        lessons = await db_client.get_records(
+            "lessons",
+            filters={"course_id": {"$in": course_ids}, "is_published": True},
+            order_by="order"
+        )
+    
+    grouped = {course_id: [] for course_id in course_ids}
+    for lesson in lessons:
+        grouped.setdefault(lesson["course_id"], []).append(lesson)
+    return grouped
+
+async def fetch_lesson(lesson_id: str) -> Optional[Dict[str, Any]]:
+    client = postgres_client if _pg_reads() else db_client
+    return await client.get_record("lessons", "id", lesson_id)
+
+async def fetch_team_members(active_only: bool) -> List[Dict[str, Any]]:
+    if _pg_reads():
+        return await postgres_client.fetch_named("active_team_members" if active_only else "team_members")
+    filters = {"is_active": True} if active_only else None
+    return await db_client.get_records("team_members", filters=filters, order_by="order")
+
+# Constant responses are encoded once at import and reused
+_COURSE_DELETED = ORJSONResponse(content={"message": "Course deleted successfully"})
+_LESSON_DELETED = ORJSONResponse(content={"message": "Lesson deleted successfully"})
+_TEAM_DELETED = ORJSONResponse(content={"message": "Team member deleted successfully"})
+_TEACHER_DELETED = ORJSONResponse(content={"message": "Teacher deleted successfully"})
+
 # ====================================================================
 # ROOT ENDPOINTS
 # ====================================================================
@@ -174,53 +405,50 @@ async def root():
     return {"message": f"Hello World with {client_type}"}
 
 # Database Administration Routes
+async def _database_tables():
+    """Таблицы базы данных с количеством записей"""
+    if USE_POSTGRES and POSTGRES_AVAILABLE:
+        # Для PostgreSQL получаем через information_schema
+        query = """
+        SELECT table_name, table_type 
+        FROM information_schema.tables 
+        WHERE table_schema = 'public' 
+        ORDER BY table_name;
+        """
+        result = await db_client.execute_raw_sql(query)
+        if not result:
+            return []
+    
+        # Считаем записи во всех таблицах одним запросом вместо запроса на каждую
+        counts = await db_client.count_many([row['table_name'] for row in result])
+    
+        return [
+            {
+                "name": row['table_name'],
+                "type": row.get('table_type', 'BASE TABLE'),
+                "record_count": counts.get(row['table_name'], 0)
+            }
+            for row in result
+        ]
+    else:
+        # Для Supabase API получаем список известных таблиц
+        # (таблицы, которые не удалось посчитать, могут не существовать)
+        counts = await db_client.count_many(KNOWN_TABLES)
+        return [
+            {
+                "name": table_name,
+                "type": "BASE TABLE",
+                "record_count": counts[table_name]
+            }
+            for table_name in KNOWN_TABLES
+            if table_name in counts
+        ]
+
 @api_router.get("/admin/database/tables", response_model=List[Dict[str, Any]])
 async def get_database_tables(current_admin: dict = Depends(get_current_admin)):
     """Получить список всех таблиц в базе данных"""
     try:
-        if USE_POSTGRES and POSTGRES_AVAILABLE:
-            # Для PostgreSQL получаем через information_schema
-            query = """
-            SELECT table_name, table_type 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            ORDER BY table_name;
-            """
-            result = await db_client.execute_raw_sql(query)
-            tables = []
-            for row in result:
-                table_name = row.get('table_name')
-                # Получаем количество записей в каждой таблице
-                count_query = f"SELECT COUNT(*) as count FROM {table_name};"
-                count_result = await db_client.execute_raw_sql(count_query)
-                count = count_result[0]['count'] if count_result else 0
-                
-                tables.append({
-                    "name": table_name,
-                    "type": row.get('table_type', 'BASE TABLE'),
-                    "record_count": count
-                })
-            return tables
-        else:
-            # Для Supabase API получаем список известных таблиц
-            known_tables = [
-                "courses", "lessons", "tests", "test_questions", "test_attempts",
-                "students", "admin_users", "teachers", "team_members",
-                "qa_questions", "qa_categories", "applications", "status_checks"
-            ]
-            tables = []
-            for table_name in known_tables:
-                try:
-                    count = await db_client.count_records(table_name)
-                    tables.append({
-                        "name": table_name,
-                        "type": "BASE TABLE",
-                        "record_count": count
-                    })
-                except Exception as e:
-                    # Таблица может не существовать
-                    continue
-            return tables
+        return await _database_tables()
     except Exception as e:
         logger.error(f"Error getting database tables: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -233,32 +461,32 @@ async def get_table_data(
     current_admin: dict = Depends(get_current_admin)
 ):
     """Получить данные из конкретной таблицы"""
+    # Имя таблицы подставляется в SQL, поэтому принимаем только известные таблицы
+    if table_name not in VALID_TABLES:
+        raise HTTPException(status_code=400, detail="Unknown table")
+    
     try:
         # Получаем данные из таблицы
         if USE_POSTGRES and POSTGRES_AVAILABLE:
-            query = f"SELECT * FROM {table_name} LIMIT {limit} OFFSET {offset};"
-            records = await db_client.execute_raw_sql(query)
+            query = f'SELECT * FROM "{table_name}" LIMIT $1 OFFSET $2;'
+            records = await db_client.execute_raw_sql(query, [limit, offset])
             
             # Получаем общее количество записей
-            count_query = f"SELECT COUNT(*) as count FROM {table_name};"
+            count_query = f'SELECT COUNT(*) as count FROM "{table_name}";'
             count_result = await db_client.execute_raw_sql(count_query)
             total_count = count_result[0]['count'] if count_result else 0
             
             # Получаем структуру таблицы
-            structure_query = f"""
+            structure_query = """
             SELECT column_name, data_type, is_nullable, column_default
             FROM information_schema.columns 
-            WHERE table_name = '{table_name}' AND table_schema = 'public'
+            WHERE table_name = $1 AND table_schema = 'public'
             ORDER BY ordinal_position;
             """
-            structure = await db_client.execute_raw_sql(structure_query)
+            structure = await db_client.execute_raw_sql(structure_query, [table_name])
         else:
             # Для Supabase API
-            records = await db_client.get_records(table_name, limit=limit)
-            # Пропускаем offset записей
-            if offset > 0:
-                all_records = await db_client.get_records(table_name)
-                records = all_records[offset:offset+limit] if offset < len(all_records) else []
+            records = await db_client.get_records(table_name, limit=limit, offset=offset)
             
             total_count = await db_client.count_records(table_name)
             
@@ -297,28 +525,21 @@ async def execute_sql_query(
         if not query:
             raise HTTPException(status_code=400, detail="Query cannot be empty")
         
-        # Базовая проверка безопасности
-        dangerous_keywords = ["DROP", "DELETE", "TRUNCATE", "ALTER", "CREATE"]
-        query_upper = query.upper()
-        
-        # Разрешаем только SELECT запросы для обычных админов
-        if current_admin.get("role") != UserRole.SUPER_ADMIN:
-            if not query_upper.startswith("SELECT"):
-                raise HTTPException(
-                    status_code=403, 
-                    detail="Only SELECT queries are allowed for regular admins"
-                )
-        
-        # Дополнительная проверка для опасных операций
-        for keyword in dangerous_keywords:
-            if keyword in query_upper and not query_upper.startswith("SELECT"):
-                if current_admin.get("role") != UserRole.SUPER_ADMIN:
-                    raise HTTPException(
-                        status_code=403, 
-                        detail=f"'{keyword}' operations require super admin privileges"
-                    )
+        # Разрешаем только одиночные SELECT запросы для обычных админов.
+        # Запрос разбирается, а не ищется по подстрокам, поэтому
+        # "SELECT ...; DROP ..." и CTE с DELETE отклоняются, а колонка dropoff_time - нет.
+        read_only = current_admin.get("role") != UserRole.SUPER_ADMIN
+        if read_only and not is_read_only_query(query):
+            raise HTTPException(
+                status_code=403, 
+                detail="Only SELECT queries are allowed for regular admins"
+            )
         
-        result = await db_client.execute_raw_sql(query)
+        if read_only and USE_POSTGRES and POSTGRES_AVAILABLE:
+            # В PostgreSQL запрос дополнительно выполняется в READ ONLY транзакции
+            result = await postgres_client.execute_raw_sql(query, read_only=True)
+        else:
+            result = await db_client.execute_raw_sql(query)
         
         return {
             "success": True,
@@ -337,62 +558,62 @@ async def execute_sql_query(
             "result": []
         }
 
+async def _database_stats():
+    """Статистика по основным таблицам"""
+    stats = {}
+    
+    # Основные таблицы для статистики
+    main_tables = {
+        "students": "Студенты",
+        "courses": "Курсы", 
+        "lessons": "Уроки",
+        "tests": "Тесты",
+        "test_attempts": "Попытки тестов",
+        "admin_users": "Администраторы",
+        "team_members": "Команда",
+        "qa_questions": "Вопросы Q&A"
+    }
+    
+    # Запрашиваем все счетчики параллельно
+    extra_counts = {
+        "active_students": ("Активные студенты", "students", {"is_active": True}),
+        "published_courses": ("Опубликованные курсы", "courses", {"status": CourseStatus.PUBLISHED})
+    }
+    counts = await asyncio.gather(
+        *[db_client.count_records(table_name) for table_name in main_tables],
+        *[db_client.count_records(table_name, filters) for _, table_name, filters in extra_counts.values()],
+        return_exceptions=True
+    )
+    main_counts = counts[:len(main_tables)]
+    additional_counts = counts[len(main_tables):]
+    
+    for (table_name, display_name), count in zip(main_tables.items(), main_counts):
+        stats[table_name] = {
+            "name": display_name,
+            "count": 0 if isinstance(count, Exception) else count
+        }
+    
+    # Дополнительная статистика
+    for (key, (display_name, _, _)), count in zip(extra_counts.items(), additional_counts):
+        if isinstance(count, Exception):
+            continue
+        stats[key] = {
+            "name": display_name,
+            "count": count
+        }
+    
+    return {
+        "database_type": "PostgreSQL via Supabase" if USE_POSTGRES else "Supabase API",
+        "connection_status": "connected",
+        "stats": stats,
+        "last_updated": now_iso()
+    }
+
 @api_router.get("/admin/database/stats")
 async def get_database_stats(current_admin: dict = Depends(get_current_admin)):
     """Получить общую статистику базы данных"""
     try:
-        stats = {}
-        
-        # Основные таблицы для статистики
-        main_tables = {
-            "students": "Студенты",
-            "courses": "Курсы", 
-            "lessons": "Уроки",
-            "tests": "Тесты",
-            "test_attempts": "Попытки тестов",
-            "admin_users": "Администраторы",
-            "team_members": "Команда",
-            "qa_questions": "Вопросы Q&A"
-        }
-        
-        for table_name, display_name in main_tables.items():
-            try:
-                count = await db_client.count_records(table_name)
-                stats[table_name] = {
-                    "name": display_name,
-                    "count": count
-                }
-            except Exception:
-                stats[table_name] = {
-                    "name": display_name,
-                    "count": 0
-                }
-        
-        # Дополнительная статистика
-        try:
-            # Активные студенты
-            active_students = await db_client.count_records("students", {"is_active": True})
-            stats["active_students"] = {
-                "name": "Активные студенты",
-                "count": active_students
-            }
-            
-            # Опубликованные курсы
-            published_courses = await db_client.count_records("courses", {"status": CourseStatus.PUBLISHED})
-            stats["published_courses"] = {
-                "name": "Опубликованные курсы", 
-                "count": published_courses
-            }
-        except Exception:
-            pass
-        
-        return {
-            "database_type": "PostgreSQL via Supabase" if USE_POSTGRES else "Supabase API",
-            "connection_status": "connected",
-            "stats": stats,
-            "last_updated": datetime.utcnow().isoformat()
-        }
-        
+        return await _database_stats()
     except Exception as e:
         logger.error(f"Error getting database stats: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -401,65 +622,77 @@ async def get_database_stats(current_admin: dict = Depends(get_current_admin)):
 async def create_database_backup(current_admin: dict = Depends(require_admin_role)):
     """Создать резервную копию важных данных"""
     try:
-        backup_data = {}
-        
         # Список таблиц для резервного копирования
         backup_tables = [
             "courses", "lessons", "tests", "test_questions",
             "students", "admin_users", "team_members", "qa_questions"
         ]
         
-        for table_name in backup_tables:
-            try:
-                records = await db_client.get_records(table_name, limit=10000)
-                backup_data[table_name] = records
-            except Exception as e:
-                logger.warning(f"Could not backup table {table_name}: {str(e)}")
-        
         # Создаем файл резервной копии
         backup_filename = f"database_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         backup_path = UPLOAD_DIR / backup_filename
         
-        with open(backup_path, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, ensure_ascii=False, indent=2, default=str)
+        # Пишем таблицы в файл по одной, не собирая всю копию в памяти
+        tables_backed_up = []
+        total_records = 0
+        async with aiofiles.open(backup_path, 'wb') as f:
+            await f.write(b'{')
+            for table_name in backup_tables:
+                try:
+                    records = await db_client.get_records(table_name, limit=10000)
+                except Exception as e:
+                    logger.warning(f"Could not backup table {table_name}: {str(e)}")
+                    continue
+                
+                payload = orjson.dumps(records, default=str, option=orjson.OPT_INDENT_2)
+                separator = b',' if tables_backed_up else b''
+                await f.write(separator + orjson.dumps(table_name) + b':' + payload)
+                
+                tables_backed_up.append(table_name)
+                total_records += len(records)
+                del records, payload
+            await f.write(b'}')
         
         return {
             "success": True,
             "backup_file": backup_filename,
             "backup_path": str(backup_path),
-            "tables_backed_up": list(backup_data.keys()),
-            "total_records": sum(len(records) for records in backup_data.values()),
-            "created_at": datetime.utcnow().isoformat()
+            "tables_backed_up": tables_backed_up,
+            "total_records": total_records,
+            "created_at": now_iso()
         }
         
     except Exception as e:
         logger.error(f"Error creating database backup: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Backup error: {str(e)}")
 
+async def _connection_info(current_admin: dict):
+    """Информация о подключении с учетом роли админа"""
+    connection_info = {
+        "database_type": "PostgreSQL via Supabase" if USE_POSTGRES else "Supabase API",
+        "use_postgres": USE_POSTGRES,
+        "supabase_url": os.getenv("SUPABASE_URL", "Not set"),
+        "has_supabase_key": bool(os.getenv("SUPABASE_ANON_KEY")),
+        "has_database_url": bool(os.getenv("DATABASE_URL")),
+        "connection_status": "connected",
+        "clients_available": {
+            "postgres": POSTGRES_AVAILABLE,
+            "supabase": SUPABASE_AVAILABLE
+        }
+    }
+    
+    # Скрываем чувствительную информацию от обычных админов
+    if current_admin.get("role") == UserRole.SUPER_ADMIN:
+        connection_info["supabase_key_preview"] = os.getenv("SUPABASE_ANON_KEY", "")[:20] + "..."
+        connection_info["database_url_preview"] = os.getenv("DATABASE_URL", "")[:50] + "..."
+    
+    return connection_info
+
 @api_router.get("/admin/database/connection-info")
 async def get_connection_info(current_admin: dict = Depends(get_current_admin)):
     """Получить информацию о подключении к базе данных"""
     try:
-        connection_info = {
-            "database_type": "PostgreSQL via Supabase" if USE_POSTGRES else "Supabase API",
-            "use_postgres": USE_POSTGRES,
-            "supabase_url": os.getenv("SUPABASE_URL", "Not set"),
-            "has_supabase_key": bool(os.getenv("SUPABASE_ANON_KEY")),
-            "has_database_url": bool(os.getenv("DATABASE_URL")),
-            "connection_status": "connected",
-            "clients_available": {
-                "postgres": POSTGRES_AVAILABLE,
-                "supabase": SUPABASE_AVAILABLE
-            }
-        }
-        
-        # Скрываем чувствительную информацию от обычных админов
-        if current_admin.get("role") == UserRole.SUPER_ADMIN:
-            connection_info["supabase_key_preview"] = os.getenv("SUPABASE_ANON_KEY", "")[:20] + "..."
-            connection_info["database_url_preview"] = os.getenv("DATABASE_URL", "")[:50] + "..."
-        
-        return connection_info
-        
+        return await _connection_info(current_admin)
     except Exception as e:
         logger.error(f"Error getting connection info: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Connection error: {str(e)}")
@@ -495,6 +728,8 @@ async def update_database_record(
         if not updated_record:
             raise HTTPException(status_code=404, detail="Record not found")
         
+        _invalidate_table_caches(table_name)
+        
         return {
             "success": True,
             "updated_record": updated_record,
@@ -538,6 +773,8 @@ async def delete_database_record(
         if not success:
             raise HTTPException(status_code=404, detail="Record not found")
         
+        _invalidate_table_caches(table_name)
+        
         return {
             "success": True,
             "message": f"Record {record_id} deleted from {table_name}",
@@ -564,11 +801,13 @@ async def create_database_record(
             record_data["id"] = str(uuid.uuid4())
         
         if "created_at" not in record_data:
-            record_data["created_at"] = datetime.utcnow().isoformat()
+            record_data["created_at"] = now_iso()
         
         # Создаем запись
         created_record = await db_client.create_record(table_name, record_data)
         
+        _invalidate_table_caches(table_name)
+        
         return {
             "success": True,
             "created_record": created_record,
@@ -610,7 +849,7 @@ async def translate_supabase_token(
                 token_info["issued_at_readable"] = datetime.fromtimestamp(token_info["issued_at"]).isoformat()
             if token_info["expires_at"]:
                 token_info["expires_at_readable"] = datetime.fromtimestamp(token_info["expires_at"]).isoformat()
-                token_info["is_expired"] = datetime.utcnow().timestamp() > token_info["expires_at"]
+                token_info["is_expired"] = time.time() > token_info["expires_at"]
         
         return {
             "success": True,
@@ -635,13 +874,7 @@ async def get_database_schema(current_admin: dict = Depends(get_current_admin)):
         else:
             # Fallback: получаем структуру из известных таблиц
             schema = []
-            known_tables = [
-                "courses", "lessons", "tests", "test_questions", "test_attempts",
-                "students", "admin_users", "teachers", "team_members", 
-                "qa_questions", "qa_categories", "applications", "status_checks"
-            ]
-            
-            for table_name in known_tables:
+            for table_name in KNOWN_TABLES:
                 try:
                     # Получаем пример записи для определения колонок
                     sample_record = await db_client.get_records(table_name, limit=1)
@@ -705,8 +938,8 @@ async def create_status_check(input: StatusCheckCreate):
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db_client.get_records("status_checks", limit=1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    # response_model validates the rows, no need to build models here as well
+    return await db_client.get_records("status_checks", limit=1000)
 
 # ====================================================================
 # AUTHENTICATION ENDPOINTS
@@ -724,7 +957,7 @@ async def admin_login(admin_data: AdminLogin):
     
     await db_client.update_record(
         "admin_users", "username", admin_data.username,
-        {"last_login": datetime.utcnow().isoformat()}
+        {"last_login": now_iso()}
     )
     
     access_token = create_access_token(data={"sub": admin["username"]})
@@ -746,7 +979,7 @@ async def unified_login(login_data: dict):
             # Update last login
             await db_client.update_record(
                 "admin_users", "email", email,
-                {"last_login": datetime.utcnow().isoformat()}
+                {"last_login": now_iso()}
             )
             
             access_token = create_access_token(data={"sub": admin["username"], "type": "admin"})
@@ -772,18 +1005,15 @@ async def unified_login(login_data: dict):
             "email": email,
             "total_score": 0,
             "is_active": True,
-            "created_at": datetime.utcnow().isoformat(),
-            "last_activity": datetime.utcnow().isoformat(),
+            "created_at": now_iso(),
+            "last_activity": now_iso(),
             "completed_courses": [],
             "current_level": CourseLevel.LEVEL_1
         }
         student = await db_client.create_record("students", student_data)
     else:
-        # Update last activity
-        await db_client.update_record(
-            "students", "email", email,
-            {"last_activity": datetime.utcnow().isoformat()}
-        )
+        # Update last activity (written by the background flush)
+        _activity_buffer[email] = now_iso()
     
     access_token = create_access_token(data={"sub": email, "type": "user"})
     return {
@@ -806,20 +1036,30 @@ async def get_current_admin_info(current_admin: dict = Depends(get_current_admin
 # DASHBOARD ENDPOINTS
 # ====================================================================
 
-@api_router.get("/admin/dashboard", response_model=DashboardStats)
-async def get_dashboard_stats(current_admin: dict = Depends(get_current_admin)):
-    total_students = await db_client.count_records("students")
-    total_courses = await db_client.count_records("courses")
-    total_lessons = await db_client.count_records("lessons")
-    total_tests = await db_client.count_records("tests")
-    total_teachers = await db_client.count_records("teachers")
-    active_students = await db_client.count_records("students", {"is_active": True})
-    pending_applications = await db_client.count_records("applications", {"status": "pending"})
-    
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    completed_tests_today = await db_client.count_records("test_attempts", {
-        "completed_at": {"$gte": today.isoformat()}
-    })
+async def _dashboard_stats() -> DashboardStats:
+    """Счетчики для главной страницы админ-панели"""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    (
+        total_students,
+        total_courses,
+        total_lessons,
+        total_tests,
+        total_teachers,
+        active_students,
+        pending_applications,
+        completed_tests_today
+    ) = await asyncio.gather(
+        db_client.count_records("students"),
+        db_client.count_records("courses"),
+        db_client.count_records("lessons"),
+        db_client.count_records("tests"),
+        db_client.count_records("teachers"),
+        db_client.count_records("students", {"is_active": True}),
+        db_client.count_records("applications", {"status": "pending"}),
+        db_client.count_records("test_attempts", {
+            "completed_at": {"$gte": today.isoformat()}
+        })
+    )
     
     return DashboardStats(
         total_students=total_students,
@@ -832,6 +1072,30 @@ async def get_dashboard_stats(current_admin: dict = Depends(get_current_admin)):
         completed_tests_today=completed_tests_today
     )
 
+@api_router.get("/admin/dashboard", response_model=DashboardStats)
+async def get_dashboard_stats(current_admin: dict = Depends(get_current_admin)):
+    return await _dashboard_stats()
+
+@api_router.get("/admin/overview")
+async def get_admin_overview(current_admin: dict = Depends(get_current_admin)):
+    """Все данные стартовой страницы админ-панели одним запросом"""
+    try:
+        dashboard, stats, tables, connection = await asyncio.gather(
+            _dashboard_stats(),
+            _database_stats(),
+            _database_tables(),
+            _connection_info(current_admin)
+        )
+        return {
+            "dashboard": dashboard,
+            "stats": stats,
+            "tables": tables,
+            "connection": connection
+        }
+    except Exception as e:
+        logger.error(f"Error getting admin overview: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 # ====================================================================
 # COURSE MANAGEMENT ENDPOINTS
 # ====================================================================
@@ -844,19 +1108,19 @@ async def get_public_courses():
         filters={"status": "published"},
         order_by="order"
     )
-    return [Course(**course) for course in courses]
+    # response_model validates the rows, no need to build models here as well
+    return courses
 
 @api_router.get("/admin/courses", response_model=List[Course])
 async def get_admin_courses(current_admin: dict = Depends(get_current_admin)):
-    courses = await db_client.get_records("courses", order_by="order")
-    return [Course(**course) for course in courses]
+    return await db_client.get_records("courses", order_by="order")
 
 @api_router.get("/courses/{course_id}", response_model=Course)
 async def get_course(course_id: str):
     course = await db_client.get_record("courses", "id", course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
-    return Course(**course)
+    return course
 
 @api_router.post("/admin/courses", response_model=Course)
 async def create_course(course_data: CourseCreate, current_admin: dict = Depends(get_current_admin)):
@@ -872,7 +1136,7 @@ async def update_course(course_id: str, course_data: CourseUpdate, current_admin
         raise HTTPException(status_code=404, detail="Course not found")
     
     update_data = {k: v for k, v in course_data.dict().items() if v is not None}
-    update_data["updated_at"] = datetime.utcnow().isoformat()
+    update_data["updated_at"] = now_iso()
     
     updated_course = await db_client.update_record("courses", "id", course_id, update_data)
     return Course(**updated_course)
@@ -886,29 +1150,40 @@ async def delete_course(course_id: str, current_admin: dict = Depends(require_ad
     success = await db_client.delete_record("courses", "id", course_id)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete course")
-    return {"message": "Course deleted successfully"}
+    
+    # lessons.course_id is ON DELETE CASCADE, so the course's lessons are gone too
+    _lessons_cache.pop(course_id, None)
+    _lesson_cache.clear()
+    return _COURSE_DELETED
 
 # ====================================================================
 # LESSON MANAGEMENT ENDPOINTS  
 # ====================================================================
 
-@api_router.get("/courses/{course_id}/lessons", response_model=List[Lesson])
-async def get_course_lessons(course_id: str):
-    lessons = await db_client.get_records(
-        "lessons", 
-        filters={"course_id": course_id, "is_published": True},
-        order_by="order"
+# The cached public listings skip FastAPI response_model validation and send the
+# cached orjson body. Rows pass through the model once per cache fill so defaults
+# such as slug are filled in.
+# `responses` keeps the schema in the OpenAPI docs.
+@api_router.get("/courses/{course_id}/lessons", response_model=None, responses={200: {"model": List[Lesson]}})
+async def get_course_lessons(course_id: str, request: Request):
+    entry = await cached(
+        _lessons_cache, course_id,
+        lambda: _encode_entry(fetch_lessons(course_id, published_only=True), Lesson)
     )
-    return [Lesson(**lesson) for lesson in lessons]
+    return etag_response(request, entry)
+
+@api_router.post("/courses/lessons:batch", response_model=Dict[str, List[Lesson]])
+async def get_lessons_batch(batch: LessonBatchRequest):
+    """Published lessons for several courses at once.
+    
+    Preferred over calling /courses/{course_id}/lessons per course (e.g. in the admin list view)."""
+    if not batch.course_ids:
+        return {}
+    return await fetch_lessons_for_courses(list(dict.fromkeys(batch.course_ids)))
 
 @api_router.get("/admin/courses/{course_id}/lessons", response_model=List[Lesson])
 async def get_admin_course_lessons(course_id: str, current_admin: dict = Depends(get_current_admin)):
-    lessons = await db_client.get_records(
-        "lessons", 
-        filters={"course_id": course_id},
-        order_by="order"
-    )
-    return [Lesson(**lesson) for lesson in lessons]
+    return await fetch_lessons(course_id, published_only=False)
 
 @api_router.get("/admin/lessons", response_model=List[Lesson])
 async def get_admin_all_lessons(current_admin: dict = Depends(get_current_admin)):
@@ -938,19 +1213,19 @@ async def get_admin_all_lessons(current_admin: dict = Depends(get_current_admin)
         logger.error(f"Error fetching all lessons: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch lessons: {str(e)}")
 
-@api_router.get("/lessons/{lesson_id}", response_model=Lesson)
-async def get_lesson(lesson_id: str):
-    lesson = await db_client.get_record("lessons", "id", lesson_id)
-    if not lesson:
+@api_router.get("/lessons/{lesson_id}", response_model=None, responses={200: {"model": Lesson}})
+async def get_lesson(lesson_id: str, request: Request):
+    entry = await cached(_lesson_cache, lesson_id, lambda: _encode_entry(fetch_lesson(lesson_id), Lesson))
+    if not entry:
         raise HTTPException(status_code=404, detail="Lesson not found")
-    return Lesson(**lesson)
+    return etag_response(request, entry)
 
 @api_router.get("/admin/lessons/{lesson_id}", response_model=Lesson)
 async def get_admin_lesson(lesson_id: str, current_admin: dict = Depends(get_current_admin)):
-    lesson = await db_client.get_record("lessons", "id", lesson_id)
+    lesson = await fetch_lesson(lesson_id)
     if not lesson:
         raise HTTPException(status_code=404, detail="Lesson not found")
-    return Lesson(**lesson)
+    return lesson
 
 @api_router.post("/admin/lessons", response_model=Lesson)
 async def create_lesson(lesson_data: LessonCreate, current_admin: dict = Depends(get_current_admin)):
@@ -960,7 +1235,7 @@ async def create_lesson(lesson_data: LessonCreate, current_admin: dict = Depends
         if not course:
             raise HTTPException(status_code=400, detail="Course not found")
         
-        lesson_dict = lesson_data.dict()
+        lesson_dict = lesson_data.model_dump()
         
         # Convert YouTube URL to embed format
         if lesson_dict.get("video_url"):
@@ -974,10 +1249,13 @@ async def create_lesson(lesson_data: LessonCreate, current_admin: dict = Depends
             raise HTTPException(status_code=400, detail="Lesson content is required")
         
         lesson_obj = Lesson(**lesson_dict)
-        created_lesson = await db_client.create_record("lessons", lesson_obj.dict())
+        created_lesson = await db_client.create_record("lessons", lesson_obj.model_dump(mode="json"))
+        
+        _invalidate_lesson_caches(created_lesson)
         
         logger.info(f"Created lesson: {created_lesson.get('id')} - {created_lesson.get('title')}")
-        return Lesson(**created_lesson)
+        # The stored row is what we just validated, no need to parse it again
+        return lesson_obj
         
     except HTTPException:
         raise
@@ -987,59 +1265,53 @@ async def create_lesson(lesson_data: LessonCreate, current_admin: dict = Depends
 
 @api_router.put("/admin/lessons/{lesson_id}", response_model=Lesson)
 async def update_lesson(lesson_id: str, lesson_data: LessonUpdate, current_admin: dict = Depends(get_current_admin)):
-    lesson = await db_client.get_record("lessons", "id", lesson_id)
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    
-    update_data = {k: v for k, v in lesson_data.dict().items() if v is not None}
+    update_data = lesson_data.model_dump(exclude_none=True, exclude_unset=True)
     
     # Convert YouTube URL to embed format
     if update_data.get("video_url"):
         update_data["video_url"] = convert_to_embed_url(update_data["video_url"])
     
-    update_data["updated_at"] = datetime.utcnow().isoformat()
+    # update_record returns None when no row matched, no separate existence check needed
+    updated_lesson = await db_client.update_record("lessons", "id", lesson_id, update_data, set_updated_at=True)
+    if not updated_lesson:
+        raise HTTPException(status_code=404, detail="Lesson not found")
     
-    updated_lesson = await db_client.update_record("lessons", "id", lesson_id, update_data)
+    _invalidate_lesson_caches(updated_lesson)
     return Lesson(**updated_lesson)
 
 @api_router.delete("/admin/lessons/{lesson_id}")
 async def delete_lesson(lesson_id: str, current_admin: dict = Depends(require_admin_role)):
-    lesson = await db_client.get_record("lessons", "id", lesson_id)
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    
     success = await db_client.delete_record("lessons", "id", lesson_id)
     if not success:
-        raise HTTPException(status_code=500, detail="Failed to delete lesson")
-    return {"message": "Lesson deleted successfully"}
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    
+    _lesson_cache.pop(lesson_id, None)
+    _lessons_cache.clear()
+    return _LESSON_DELETED
 
 # ====================================================================
 # TEAM MANAGEMENT ENDPOINTS
 # ====================================================================
 
-@api_router.get("/team", response_model=List[TeamMember])
-async def get_team_members():
+@api_router.get("/team", response_model=None, responses={200: {"model": List[TeamMember]}})
+async def get_team_members(request: Request):
     """Get all active team members for public page"""
-    members = await db_client.get_records(
-        "team_members", 
-        filters={"is_active": True},
-        order_by="order"
-    )
-    return [TeamMember(**member) for member in members]
+    entry = await cached(_team_cache, "active", lambda: _encode_entry(fetch_team_members(active_only=True), TeamMember))
+    return etag_response(request, entry)
 
 @api_router.get("/admin/team", response_model=List[TeamMember])
 async def get_admin_team_members(current_admin: dict = Depends(get_current_admin)):
     """Get all team members for admin"""
-    members = await db_client.get_records("team_members", order_by="order")
-    return [TeamMember(**member) for member in members]
+    return await fetch_team_members(active_only=False)
 
 @api_router.post("/admin/team", response_model=TeamMember)
 async def create_team_member(member_data: TeamMemberCreate, current_admin: dict = Depends(get_current_admin)):
     """Create new team member"""
-    member_dict = member_data.dict()
+    member_dict = member_data.model_dump()
     member_obj = TeamMember(**member_dict)
-    created_member = await db_client.create_record("team_members", member_obj.dict())
-    return TeamMember(**created_member)
+    await db_client.create_record("team_members", member_obj.model_dump(mode="json"))
+    _team_cache.clear()
+    return member_obj
 
 @api_router.put("/admin/team/{member_id}", response_model=TeamMember)
 async def update_team_member(
@@ -1048,14 +1320,12 @@ async def update_team_member(
     current_admin: dict = Depends(get_current_admin)
 ):
     """Update team member"""
-    member = await db_client.get_record("team_members", "id", member_id)
-    if not member:
+    update_data = member_data.model_dump(exclude_none=True, exclude_unset=True)
+    updated_member = await db_client.update_record("team_members", "id", member_id, update_data, set_updated_at=True)
+    if not updated_member:
         raise HTTPException(status_code=404, detail="Team member not found")
     
-    update_data = {k: v for k, v in member_data.dict().items() if v is not None}
-    update_data["updated_at"] = datetime.utcnow().isoformat()
-    
-    updated_member = await db_client.update_record("team_members", "id", member_id, update_data)
+    _team_cache.clear()
     return TeamMember(**updated_member)
 
 @api_router.delete("/admin/team/{member_id}")
@@ -1064,7 +1334,8 @@ async def delete_team_member(member_id: str, current_admin: dict = Depends(requi
     success = await db_client.delete_record("team_members", "id", member_id)
     if not success:
         raise HTTPException(status_code=404, detail="Team member not found")
-    return {"message": "Team member deleted successfully"}
+    _team_cache.clear()
+    return _TEAM_DELETED
 
 # ====================================================================
 # TEACHER MANAGEMENT ENDPOINTS
@@ -1112,7 +1383,7 @@ async def update_teacher(
                 raise HTTPException(status_code=400, detail="Teacher with this email already exists")
         
         update_data = teacher_data.dict()
-        update_data["updated_at"] = datetime.utcnow().isoformat()
+        update_data["updated_at"] = now_iso()
         
         updated_teacher = await db_client.update_record("teachers", "id", teacher_id, update_data)
         return Teacher(**updated_teacher)
@@ -1133,7 +1404,7 @@ async def delete_teacher(teacher_id: str, current_admin: dict = Depends(require_
         success = await db_client.delete_record("teachers", "id", teacher_id)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete teacher")
-        return {"message": "Teacher deleted successfully"}
+        return _TEACHER_DELETED
     except HTTPException:
         raise
     except Exception as e:
@@ -1143,21 +1414,27 @@ async def delete_teacher(teacher_id: str, current_admin: dict = Depends(require_
 # Include the router in the main app
 app.include_router(api_router)
 
+# Explicit origins (comma separated in CORS_ORIGINS) plus any Replit subdomain.
+# No "*": with credentials it only made Starlette echo every origin back.
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=[
-        "http://localhost:3000",
-        "https://*.replit.dev", 
-        "https://*.replit.co",
-        "https://*.replit.app",
-        "https://*.repl.co",
-        "*"
-    ],
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_origin_regex=r"^https://([a-z0-9-]+\.)*(replit\.(dev|co|app)|repl\.co)$",
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
+# Compress JSON listings; level 5 keeps CPU cost low for nearly the same ratio
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1165,42 +1442,96 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_autostart_task: Optional[asyncio.Task] = None
+
+# Indexes matching the filter/order shape of get_course_lessons and get_team_members
+STARTUP_INDEXES = [
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lessons_course_pub_order '
+    'ON lessons (course_id, is_published, "order")',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_team_active_order '
+    'ON team_members (is_active, "order")',
+]
+
+async def _run_autostart():
+    """Run autostart_supabase.py without blocking the event loop"""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            str(ROOT_DIR / "autostart_supabase.py"),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), timeout=30)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            logger.warning("⚠️ Supabase autostart timed out")
+            return
+        
+        if proc.returncode == 0:
+            logger.info("✅ Supabase autostart completed successfully")
+        else:
+            logger.warning(f"⚠️ Supabase autostart issues: {stderr.decode(errors='replace')}")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not run autostart: {e}")
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize default data and ensure quality content"""
+    global VALID_TABLES, _activity_flush_task, _admins_refresh_task, _autostart_task
     client_type = "PostgreSQL" if USE_POSTGRES and POSTGRES_AVAILABLE else "Supabase"
     logger.info(f"Starting application with {client_type} integration...")
     
+    # Create the connection pool up front instead of on the first request
+    if (USE_POSTGRES or USE_POSTGRES_READS) and POSTGRES_AVAILABLE:
+        try:
+            await postgres_client.init_pool()
+            
+            # CONCURRENTLY cannot run in a transaction, so each index is its own statement
+            for ddl in STARTUP_INDEXES:
+                try:
+                    await postgres_client.execute_command(ddl)
+                except Exception as e:
+                    logger.warning(f"Could not create index: {e}")
+        except Exception as e:
+            logger.error(f"Could not create PostgreSQL connection pool: {e}")
+    
+    if USE_POSTGRES and POSTGRES_AVAILABLE:
+        try:
+            # Load the real table list once for table-name validation
+            rows = await db_client.execute_raw_sql(
+                "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public';"
+            )
+            if rows:
+                VALID_TABLES = frozenset(row['table_name'] for row in rows)
+            logger.info(f"Loaded {len(VALID_TABLES)} tables for validation")
+        except Exception as e:
+            logger.error(f"Could not load table list: {e}")
+    
+    _activity_flush_task = asyncio.create_task(_activity_flush_loop())
+    _admins_refresh_task = asyncio.create_task(_admins_refresh_loop())
+    
     # Check if admins exist
     try:
-        admin_count = await db_client.count_records("admin_users")
-        logger.info(f"Found {admin_count} admin users in database")
-        
-        # Check existing team members
-        team_count = await db_client.count_records("team_members")
-        logger.info(f"Found {team_count} team members in database")
-        
-        # Check courses
-        course_count = await db_client.count_records("courses", {"status": "published"})
-        logger.info(f"Found {course_count} published courses in database")
+        # Check admins, team members and published courses concurrently
+        startup_counts = await asyncio.gather(
+            db_client.count_records("admin_users"),
+            db_client.count_records("team_members"),
+            db_client.count_records("courses", {"status": "published"}),
+            return_exceptions=True
+        )
+        for label, count in zip(["admin users", "team members", "published courses"], startup_counts):
+            if isinstance(count, Exception):
+                logger.error(f"Could not count {label}: {count}")
+            else:
+                logger.info(f"Found {count} {label} in database")
         
-        # Run autostart to ensure quality data (only for Supabase)
+        # Run autostart to ensure quality data (only for Supabase).
+        # It runs in the background so the app starts serving requests right away.
         if not USE_POSTGRES:
             logger.info("Running Supabase autostart to ensure quality data...")
-            try:
-                import subprocess
-                import sys
-                result = subprocess.run([
-                    sys.executable, 
-                    str(ROOT_DIR / "autostart_supabase.py")
-                ], capture_output=True, text=True, timeout=30)
-                
-                if result.returncode == 0:
-                    logger.info("✅ Supabase autostart completed successfully")
-                else:
-                    logger.warning(f"⚠️ Supabase autostart issues: {result.stderr}")
-            except Exception as e:
-                logger.warning(f"⚠️ Could not run autostart: {e}")
+            _autostart_task = asyncio.create_task(_run_autostart())
         
         logger.info(f"Application startup completed with {client_type} integration")
     except Exception as e:
@@ -1209,5 +1540,12 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Application shutdown")
-    if USE_POSTGRES and POSTGRES_AVAILABLE:
+    if _admins_refresh_task:
+        _admins_refresh_task.cancel()
+    if _activity_flush_task:
+        _activity_flush_task.cancel()
+        # Wait for an interrupted flush to re-queue its stamps before the final flush
+        await asyncio.gather(_activity_flush_task, return_exceptions=True)
+    await _flush_activity_buffer()
+    if POSTGRES_AVAILABLE:
         await postgres_client.close_pool()
\ No newline at end of file
@@ -0,0 +1,24 @@
+import sqlparse
+from sqlparse import tokens as T
+
+# Ключевые слова, которые превращают SELECT в изменяющий запрос:
+# SELECT ... INTO создает таблицу, COPY пишет в файлы
+_FORBIDDEN_KEYWORDS = {"INTO", "COPY"}
+
+def is_read_only_query(query: str) -> bool:
+    """True, если запрос - один SELECT без изменяющих данных частей.
+
+    Проверяются все токены, а не только первый: get_type() у
+    "WITH d AS (DELETE ...) SELECT ..." возвращает SELECT."""
+    statements = [stmt for stmt in sqlparse.parse(query) if stmt.token_first(skip_cm=True)]
+    if len(statements) != 1 or statements[0].get_type() != "SELECT":
+        return False
+    
+    for token in statements[0].flatten():
+        if token.ttype in T.Keyword.DDL or token.ttype in T.Keyword.DCL:
+            return False
+        if token.ttype in T.Keyword.DML and token.normalized != "SELECT":
+            return False
+        if token.ttype in T.Keyword and token.normalized in _FORBIDDEN_KEYWORDS:
+            return False
+    return True
@@ -1,8 +1,9 @@
 import os
+import asyncio
 from supabase import create_client, Client
 from typing import List, Dict, Any, Optional
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
 from dotenv import load_dotenv
 
@@ -21,13 +22,18 @@ class SupabaseClient:
         
         self.client: Client = create_client(url, key)
         logger.info("Supabase client initialized")
+        logger.warning("Supabase client is synchronous, requests are offloaded with asyncio.to_thread")
+
+    async def _execute(self, query):
+        """Run a blocking supabase-py request in a worker thread so it does not stall the event loop"""
+        return await asyncio.to_thread(query.execute)
 
     async def create_record(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new record in the specified table"""
         try:
             # Convert datetime objects to ISO string format
             processed_data = self._process_data_for_insert(data)
-            result = self.client.table(table).insert(processed_data).execute()
+            result = await self._execute(self.client.table(table).insert(processed_data))
             if result.data:
                 return result.data[0]
             else:
@@ -39,7 +45,7 @@ class SupabaseClient:
     async def get_record(self, table: str, id_field: str, id_value: str) -> Optional[Dict[str, Any]]:
         """Get a single record by ID"""
         try:
-            result = self.client.table(table).select("*").eq(id_field, id_value).execute()
+            result = await self._execute(self.client.table(table).select("*").eq(id_field, id_value))
             if result.data:
                 return result.data[0]
             return None
@@ -48,7 +54,8 @@ class SupabaseClient:
             raise
 
     async def get_records(self, table: str, filters: Optional[Dict[str, Any]] = None, 
-                         order_by: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+                         order_by: Optional[str] = None, limit: Optional[int] = None,
+                         offset: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get multiple records with optional filters"""
         try:
             query = self.client.table(table).select("*")
@@ -77,21 +84,27 @@ class SupabaseClient:
                     # Ascending order
                     query = query.order(order_by)
             
-            if limit:
+            if offset:
+                # PostgREST paginates via Range, so only the requested page is transferred
+                query = query.range(offset, offset + (limit or 1000) - 1)
+            elif limit:
                 query = query.limit(limit)
                 
-            result = query.execute()
+            result = await self._execute(query)
             return result.data if result.data else []
         except Exception as e:
             logger.error(f"Error getting records from {table}: {str(e)}")
             raise
 
     async def update_record(self, table: str, id_field: str, id_value: str, 
-                          data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Update a record by ID"""
+                          data: Dict[str, Any], set_updated_at: bool = False) -> Optional[Dict[str, Any]]:
+        """Update a record by ID; set_updated_at stamps updated_at with the current UTC time"""
         try:
             processed_data = self._process_data_for_update(data)
-            result = self.client.table(table).update(processed_data).eq(id_field, id_value).execute()
+            if set_updated_at:
+                # PostgREST cannot send NOW(), so use an aware timestamp
+                processed_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+            result = await self._execute(self.client.table(table).update(processed_data).eq(id_field, id_value))
             if result.data:
                 return result.data[0]
             return None
@@ -102,8 +115,9 @@ class SupabaseClient:
     async def delete_record(self, table: str, id_field: str, id_value: str) -> bool:
         """Delete a record by ID"""
         try:
-            result = self.client.table(table).delete().eq(id_field, id_value).execute()
-            return True
+            result = await self._execute(self.client.table(table).delete().eq(id_field, id_value))
+            # PostgREST returns the deleted rows, so an empty result means nothing matched
+            return bool(result.data)
         except Exception as e:
             logger.error(f"Error deleting record from {table}: {str(e)}")
             raise
@@ -111,7 +125,8 @@ class SupabaseClient:
     async def count_records(self, table: str, filters: Optional[Dict[str, Any]] = None) -> int:
         """Count records in a table with optional filters"""
         try:
-            query = self.client.table(table).select("*", count="exact")
+            # head=True sends a HEAD request: only the Content-Range count comes back, no rows
+            query = self.client.table(table).select("*", count="exact", head=True)
             
             if filters:
                 for field, value in filters.items():
@@ -126,12 +141,23 @@ class SupabaseClient:
                     else:
                         query = query.eq(field, value)
             
-            result = query.execute()
+            result = await self._execute(query)
             return result.count if result.count is not None else 0
         except Exception as e:
             logger.error(f"Error counting records in {table}: {str(e)}")
             raise
 
+    async def count_many(self, tables: List[str]) -> Dict[str, int]:
+        """Count records in several tables concurrently, skipping tables that fail"""
+        counts = await asyncio.gather(
+            *[self.count_records(table) for table in tables],
+            return_exceptions=True
+        )
+        return {
+            table: count for table, count in zip(tables, counts)
+            if not isinstance(count, Exception)
+        }
+
     async def find_one(self, table: str, filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Find a single record with filters (equivalent to MongoDB find_one)"""
         try:
@@ -147,7 +173,7 @@ class SupabaseClient:
                 else:
                     query = query.eq(field, value)
             
-            result = query.limit(1).execute()
+            result = await self._execute(query.limit(1))
             if result.data:
                 return result.data[0]
             return None
@@ -168,10 +194,10 @@ class SupabaseClient:
                         if group_by.startswith("$"):
                             field_name = group_by[1:]  # Remove $ prefix
                             # Use PostgreSQL aggregation
-                            result = self.client.rpc('aggregate_by_field', {
+                            result = await self._execute(self.client.rpc('aggregate_by_field', {
                                 'table_name': table,
                                 'field_name': field_name
-                            }).execute()
+                            }))
                             return result.data if result.data else []
             
             # Fallback for unsupported aggregations
@@ -212,7 +238,7 @@ class SupabaseClient:
     async def execute_raw_sql(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Execute raw SQL query (for complex operations)"""
         try:
-            result = self.client.rpc('execute_sql', {'query': query, 'params': params or {}}).execute()
+            result = await self._execute(self.client.rpc('execute_sql', {'query': query, 'params': params or {}}))
             return result.data if result.data else []
         except Exception as e:
             logger.error(f"Error executing raw SQL: {str(e)}")
@@ -275,7 +301,7 @@ class SupabaseClient:
         """Get database schema information"""
         try:
             # Try to get schema via RPC call
-            schema_info = self.client.rpc('get_schema_info').execute()
+            schema_info = await self._execute(self.client.rpc('get_schema_info'))
             if schema_info.data:
                 return schema_info.data
             else:
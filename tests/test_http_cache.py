@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("cachetools")
+pytest.importorskip("starlette")
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from cachetools import TTLCache
+from starlette.requests import Request
+
+from http_cache import PUBLIC_CACHE_CONTROL, cached, etag_for, etag_response, _cache_locks
+
+BODY = b'[{"id":"1"}]'
+ETAG = etag_for(BODY)
+
+
+def make_request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_etag_is_quoted_and_stable():
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert etag_for(BODY) == ETAG
+    assert etag_for(b"[]") != ETAG
+
+
+def test_sends_body_without_if_none_match():
+    response = etag_response(make_request(), (BODY, ETAG))
+    assert response.status_code == 200
+    assert response.body == BODY
+    assert response.headers["etag"] == ETAG
+    assert response.headers["cache-control"] == PUBLIC_CACHE_CONTROL
+    assert response.headers["content-type"] == "application/json"
+
+
+@pytest.mark.parametrize("header", [
+    ETAG,
+    f"W/{ETAG}",
+    f'"other", {ETAG}',
+    f'"other",W/{ETAG}',
+    "*",
+])
+def test_matching_if_none_match_returns_304(header):
+    response = etag_response(make_request(header), (BODY, ETAG))
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == ETAG
+    assert response.headers["cache-control"] == PUBLIC_CACHE_CONTROL
+
+
+@pytest.mark.parametrize("header", ['"other"', "", ETAG.strip('"')])
+def test_different_if_none_match_sends_body(header):
+    response = etag_response(make_request(header), (BODY, ETAG))
+    assert response.status_code == 200
+    assert response.body == BODY
+
+
+def test_concurrent_misses_load_once():
+    cache = TTLCache(maxsize=10, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return (BODY, ETAG)
+
+    async def run():
+        return await asyncio.gather(*[cached(cache, "key", loader) for _ in range(10)])
+
+    results = asyncio.run(run())
+    assert calls == [1]
+    assert all(result == (BODY, ETAG) for result in results)
+    assert cache["key"] == (BODY, ETAG)
+    assert not _cache_locks
+
+
+def test_hit_skips_loader():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache["key"] = (BODY, ETAG)
+
+    async def loader():
+        raise AssertionError("loader must not run on a hit")
+
+    assert asyncio.run(cached(cache, "key", loader)) == (BODY, ETAG)
+
+
+def test_missing_value_is_not_cached():
+    cache = TTLCache(maxsize=10, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return None
+
+    assert asyncio.run(cached(cache, "missing", loader)) is None
+    assert asyncio.run(cached(cache, "missing", loader)) is None
+    assert "missing" not in cache
+    assert len(calls) == 2
@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("dotenv")
+if not os.environ.get("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from postgres_client import PostgreSQLClient
+
+
+def test_fetch_named_twice_on_the_same_connection():
+    async def run():
+        client = PostgreSQLClient()
+        # A single connection, so the second call reuses the one released by the first
+        client.pool_min_size = client.pool_max_size = 1
+        try:
+            first = await client.fetch_named("active_team_members")
+            second = await client.fetch_named("active_team_members")
+            lessons = await client.fetch_named("published_lessons_by_course", "missing-course")
+            all_lessons = await client.fetch_named("lessons_by_course", "missing-course")
+        finally:
+            await client.close_pool()
+        return first, second, lessons, all_lessons
+
+    first, second, lessons, all_lessons = asyncio.run(run())
+    assert first == second
+    assert lessons == [] and all_lessons == []
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("sqlparse")
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from sql_guard import is_read_only_query
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM students",
+    "select id, dropoff_time, updated_at from lessons where title = 'delete me'",
+    "WITH t AS (SELECT id FROM courses) SELECT * FROM t",
+    "SELECT 1; -- DROP TABLE students",
+])
+def test_allows_plain_select(query):
+    assert is_read_only_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    "",
+    "DELETE FROM students",
+    "SELECT 1; DROP TABLE students",
+    "WITH d AS (DELETE FROM students RETURNING *) SELECT * FROM d",
+    "WITH u AS (UPDATE students SET total_score = 0 RETURNING id) SELECT * FROM u",
+    "SELECT * INTO students_copy FROM students",
+    "SELECT * FROM students FOR UPDATE",
+])
+def test_rejects_modifying_queries(query):
+    assert not is_read_only_query(query)